@@ -0,0 +1,95 @@
+import os
+import hashlib
+from typing import Any, Optional, Tuple
+
+import orjson
+from redis.asyncio import Redis
+
+# Redis configuration (caching is disabled when REDIS_URL is not set)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+# Bumped on every book mutation; every cache entry records the version it was
+# stored under, so a bump invalidates all cached responses at once
+VERSION_KEY = "library:cache_version"
+
+class Cache:
+    client: Redis = None
+
+# Global cache instance
+cache = Cache()
+
+async def connect_to_redis():
+    """Create Redis connection (the API keeps working without it)"""
+    if not REDIS_URL:
+        print("REDIS_URL not set, response caching disabled")
+        return None
+
+    try:
+        cache.client = Redis.from_url(REDIS_URL)
+        await cache.client.ping()
+        print(f"Successfully connected to Redis at {REDIS_URL}")
+    except Exception as e:
+        print(f"Failed to connect to Redis, response caching disabled: {e}")
+        cache.client = None
+
+    return cache.client
+
+async def close_redis_connection():
+    """Close Redis connection"""
+    if cache.client:
+        await cache.client.aclose()
+        print("Disconnected from Redis")
+
+def cache_key(namespace: str, **params) -> str:
+    """Build the cache key for a request from its normalized parameters"""
+    normalized = orjson.dumps(params, option=orjson.OPT_SORT_KEYS)
+    return f"library:{namespace}:{hashlib.md5(normalized).hexdigest()}"
+
+async def get_cached(key: str) -> Tuple[Optional[Any], Optional[str]]:
+    """Return (cached payload or None on a miss, current cache version)"""
+    if not cache.client:
+        return None, None
+
+    try:
+        # One round-trip: the entry and the current version together
+        cached, version = await cache.client.mget(key, VERSION_KEY)
+        version = version.decode() if version is not None else "0"
+    except Exception as e:
+        print(f"Error reading from cache: {e}")
+        return None, None
+
+    if cached is None:
+        return None, version
+
+    try:
+        entry = orjson.loads(cached)
+        if entry["version"] != version:
+            # Stored before the last book mutation
+            return None, version
+        return entry["payload"], version
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        # Corrupt or foreign value under our key; treat it as a miss
+        print(f"Ignoring unreadable cache entry {key}: {e}")
+        return None, version
+
+async def set_cached(key: str, version: Optional[str], payload: Any):
+    """Store a payload for CACHE_TTL_SECONDS under the version get_cached returned"""
+    if version is None or not cache.client:
+        return
+
+    try:
+        entry = orjson.dumps({"version": version, "payload": payload})
+        await cache.client.setex(key, CACHE_TTL_SECONDS, entry)
+    except Exception as e:
+        print(f"Error writing to cache: {e}")
+
+async def invalidate_cache():
+    """Invalidate all cached responses after a book mutation"""
+    if not cache.client:
+        return
+
+    try:
+        await cache.client.incr(VERSION_KEY)
+    except Exception as e:
+        print(f"Error invalidating cache: {e}")
@@ -1,16 +1,23 @@
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 import asyncio
 
 # MongoDB configuration
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "library_management")
 
+# Connection pool configuration
+MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+
 class Database:
     client: AsyncIOMotorClient = None
     database = None
 
+# Marker document (in the meta collection) recording that genre_counts was seeded
+GENRE_COUNTS_SEEDED_ID = "genre_counts_seeded"
+
 # Global database instance
 database = Database()
 
@@ -21,16 +28,32 @@ async def get_database():
 async def connect_to_mongo():
     """Create database connection"""
     try:
-        database.client = AsyncIOMotorClient(MONGODB_URL)
+        database.client = AsyncIOMotorClient(
+            MONGODB_URL,
+            maxPoolSize=MAX_POOL_SIZE,
+            minPoolSize=MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=3000,
+            connectTimeoutMS=3000,
+            waitQueueTimeoutMS=2000,
+            # Return stored datetimes (e.g. updated_at) as timezone-aware UTC
+            tz_aware=True
+        )
         database.database = database.client[DATABASE_NAME]
         
         # Test the connection
         await database.client.admin.command('ping')
+        
+        # Warm the pool so the first requests don't pay the connection handshake
+        await asyncio.gather(*[
+            database.client.admin.command('ping') for _ in range(MIN_POOL_SIZE)
+        ])
         print(f"Successfully connected to MongoDB at {MONGODB_URL}")
         print(f"Using database: {DATABASE_NAME}")
         
         # Create indexes for better performance
         await create_indexes()
+        await backfill_genre_lower()
+        await seed_genre_counts()
         
         return database.database
     except ConnectionFailure as e:
@@ -49,23 +72,99 @@ async def close_mongo_connection():
 async def create_indexes():
     """Create database indexes for better performance"""
     try:
-        # Create index on ISBN for uniqueness and faster lookups
-        await database.database.books.create_index("ISBN", unique=True)
+        books = database.database.books
         
-        # Create text index for search functionality
-        await database.database.books.create_index([
-            ("title", "text"),
-            ("author", "text")
-        ])
+        # The indexes are independent, so issue all create_index calls concurrently
+        await asyncio.gather(
+            # Create index on ISBN for uniqueness and faster lookups
+            books.create_index("ISBN", unique=True),
+            
+            # Create text index for search functionality
+            books.create_index([
+                ("title", "text"),
+                ("author", "text")
+            ]),
+            
+            # Create indexes for filter_books: equality fields first, then _id, so each
+            # cursor page is an _id-ordered range scan bounded by the page size.
+            # Genre is matched case-insensitively through the stored genre_lower field.
+            books.create_index([
+                ("genre_lower", 1),
+                ("publication_year", 1),
+                ("_id", 1)
+            ]),
+            books.create_index([
+                ("genre_lower", 1),
+                ("_id", 1)
+            ]),
+            books.create_index([
+                ("publication_year", 1),
+                ("_id", 1)
+            ])
+        )
         
-        # Create indexes for filtering
-        await database.database.books.create_index("genre")
-        await database.database.books.create_index("publication_year")
+        # Drop filter indexes from earlier versions, replaced by the ones above
+        existing_indexes = await books.index_information()
+        for index_name in ("genre_1", "publication_year_1"):
+            if index_name in existing_indexes:
+                await books.drop_index(index_name)
         
         print("Database indexes created successfully")
     except Exception as e:
         print(f"Error creating indexes: {e}")
 
+async def backfill_genre_lower():
+    """Set genre_lower on books stored before it was maintained on write"""
+    try:
+        result = await database.database.books.update_many(
+            {"genre_lower": {"$exists": False}},
+            [{"$set": {"genre_lower": {"$toLower": "$genre"}}}]
+        )
+        if result.modified_count:
+            print(f"Backfilled genre_lower on {result.modified_count} books")
+    except Exception as e:
+        print(f"Error backfilling genre_lower: {e}")
+
+async def seed_genre_counts():
+    """Build the genre_counts collection from the books, once per database"""
+    # A marker document makes sure only one process ever seeds, even when several
+    # workers start together. Counter updates applied by other processes while the
+    # seed runs can still be overwritten, so the first startup after upgrading
+    # should be a single process (e.g. run `python database.py` once) before
+    # scaling out.
+    try:
+        # Claim the seed; if the marker already exists, another process did it
+        try:
+            await database.database.meta.insert_one({"_id": GENRE_COUNTS_SEEDED_ID})
+        except DuplicateKeyError:
+            return
+        
+        pipeline = [
+            {
+                "$group": {
+                    "_id": "$genre",
+                    "count": {"$sum": 1}
+                }
+            },
+            {
+                "$merge": {
+                    "into": "genre_counts",
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }
+            }
+        ]
+        try:
+            await database.database.books.aggregate(pipeline).to_list(length=None)
+        except Exception:
+            # Release the claim so the next startup retries
+            await database.database.meta.delete_one({"_id": GENRE_COUNTS_SEEDED_ID})
+            raise
+        
+        print("Genre counts seeded successfully")
+    except Exception as e:
+        print(f"Error seeding genre counts: {e}")
+
 # Initialize database connection
 async def init_db():
     """Initialize database connection"""
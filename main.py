@@ -1,29 +1,52 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from typing import Optional, List
+from collections import Counter
+from datetime import datetime, timezone
+import asyncio
+import hashlib
 import os
+import re
+import time
 from contextlib import asynccontextmanager
 
-from models import BookCreate, BookUpdate, BookResponse
-from database import get_database
+from models import (
+    BookCreate, BookUpdate, BookResponse, BookListResponse,
+    BookBulkError, BookBulkCreateResponse
+)
+from database import init_db, close_mongo_connection
+from cache import connect_to_redis, close_redis_connection, cache_key, get_cached, set_cached, invalidate_cache
 
 # Global database variable
 db = None
 
+# Maximum number of books accepted by a single bulk create
+BULK_CREATE_LIMIT = 1000
+
+# Fields returned for a book (_id is always included)
+BOOK_PROJECTION = {"title": 1, "author": 1, "ISBN": 1, "genre": 1, "publication_year": 1, "updated_at": 1}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     global db
-    db = await get_database()
+    db = await init_db()
+    await connect_to_redis()
     yield
-    # Shutdown - MongoDB client will be closed automatically
+    # Shutdown
+    await close_redis_connection()
+    await close_mongo_connection()
 
 app = FastAPI(
     title="Library Management System",
     description="A comprehensive API for managing library books with CRUD operations, search, filter, and analytics",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -32,45 +55,147 @@ async def root():
     """Welcome endpoint"""
     return {"message": "Welcome to Library Management System API", "docs": "/docs"}
 
+async def adjust_genre_count(genre: Optional[str], delta: int):
+    """Apply a delta to the per-genre book counter"""
+    # Called after the book write has already succeeded, so a failure here is
+    # logged rather than turned into an error response for a stored change
+    try:
+        await db.genre_counts.update_one(
+            {"_id": genre},
+            {"$inc": {"count": delta}},
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Error updating genre count for {genre!r} by {delta}: {e}")
+
+def parse_object_id(value: str, detail: str) -> ObjectId:
+    """Parse an ObjectId once, raising a 400 with the given detail if it is invalid"""
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=detail)
+
+def utc_now() -> datetime:
+    """Current UTC time, truncated to the millisecond precision stored by MongoDB"""
+    now = datetime.now(timezone.utc)
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def book_etag(book_id: str, updated_at: datetime) -> str:
+    """Build the ETag for a version of a book"""
+    return '"' + hashlib.md5(f"{book_id}:{updated_at.timestamp()}".encode()).hexdigest() + '"'
+
 # CRUD Operations
 
 @app.post("/books/", response_model=BookResponse, status_code=201)
 async def create_book(book: BookCreate):
     """Create a new book in the library"""
     try:
-        # Check if book with same ISBN already exists
-        existing_book = await db.books.find_one({"ISBN": book.ISBN})
-        if existing_book:
+        book_dict = book.model_dump()
+        book_dict["updated_at"] = utc_now()
+        book_dict["genre_lower"] = book_dict["genre"].lower()
+        try:
+            await db.books.insert_one(book_dict)
+        except DuplicateKeyError:
+            # The unique ISBN index rejects duplicates, no pre-check needed
             raise HTTPException(status_code=400, detail="Book with this ISBN already exists")
         
-        book_dict = book.dict()
-        result = await db.books.insert_one(book_dict)
+        await adjust_genre_count(book_dict["genre"], 1)
+        await invalidate_cache()
         
-        # Retrieve the created book
-        created_book = await db.books.find_one({"_id": result.inserted_id})
-        created_book["id"] = str(created_book["_id"])
-        del created_book["_id"]
+        # Build the response from the inserted document instead of re-reading it;
+        # the fields were already validated by BookCreate
+        book_dict["id"] = str(book_dict.pop("_id"))
         
-        return BookResponse(**created_book)
+        return BookResponse.model_construct(**book_dict)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Error creating book: {str(e)}")
 
+@app.post(
+    "/books/bulk",
+    response_model=BookBulkCreateResponse,
+    status_code=201,
+    responses={207: {"model": BookBulkCreateResponse, "description": "Some books failed or were not durably written"}}
+)
+async def create_books_bulk(
+    response: Response,
+    books: List[BookCreate] = Body(..., min_length=1, max_length=BULK_CREATE_LIMIT)
+):
+    """Create many books in one round-trip, skipping any that fail (e.g. duplicate ISBN)"""
+    try:
+        updated_at = utc_now()
+        book_dicts = [
+            {**book.model_dump(), "updated_at": updated_at, "genre_lower": book.genre.lower()}
+            for book in books
+        ]
+        
+        # Unordered so the server keeps going past individual failures
+        errors = []
+        write_concern_errors = []
+        try:
+            await db.books.insert_many(book_dicts, ordered=False)
+        except BulkWriteError as e:
+            # Writes reported here were applied but not acknowledged with the
+            # requested durability
+            write_concern_errors = [
+                error["errmsg"] for error in e.details.get("writeConcernErrors", [])
+            ]
+            for write_error in e.details.get("writeErrors", []):
+                if write_error["code"] == 11000:
+                    detail = "Book with this ISBN already exists"
+                else:
+                    detail = write_error["errmsg"]
+                errors.append(BookBulkError(index=write_error["index"], detail=detail))
+        
+        failed = {error.index for error in errors}
+        inserted = [book_dict for index, book_dict in enumerate(book_dicts) if index not in failed]
+        
+        if inserted:
+            genre_deltas = Counter(book_dict["genre"] for book_dict in inserted)
+            await asyncio.gather(*[
+                adjust_genre_count(genre, delta) for genre, delta in genre_deltas.items()
+            ])
+            await invalidate_cache()
+        
+        # 201 when every book was stored; 207 when the outcome is mixed
+        if errors or write_concern_errors:
+            response.status_code = 207
+        
+        return BookBulkCreateResponse(
+            inserted_count=len(inserted),
+            inserted_ids=[str(book_dict["_id"]) for book_dict in inserted],
+            errors=sorted(errors, key=lambda error: error.index),
+            write_concern_errors=write_concern_errors
+        )
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error creating books: {str(e)}")
+
 @app.get("/books/{book_id}", response_model=BookResponse)
-async def get_book(book_id: str):
-    """Get a book by its ID"""
+async def get_book(book_id: str, request: Request, response: Response):
+    """Get a book by its ID (supports conditional requests via ETag/If-None-Match)"""
     try:
-        if not ObjectId.is_valid(book_id):
-            raise HTTPException(status_code=400, detail="Invalid book ID format")
+        oid = parse_object_id(book_id, "Invalid book ID format")
         
-        book = await db.books.find_one({"_id": ObjectId(book_id)})
+        book = await db.books.find_one({"_id": oid}, projection=BOOK_PROJECTION)
         if not book:
             raise HTTPException(status_code=404, detail="Book not found")
         
+        # Books stored before updated_at was tracked get no ETag
+        if book.get("updated_at"):
+            etag = book_etag(book_id, book["updated_at"])
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and (if_none_match.strip() == "*" or etag in [
+                re.sub(r"^W/", "", tag.strip()) for tag in if_none_match.split(",")
+            ]):
+                return Response(status_code=304, headers={"ETag": etag})
+            response.headers["ETag"] = etag
+        
         book["id"] = str(book["_id"])
         del book["_id"]
-        return BookResponse(**book)
+        return BookResponse.model_construct(**book)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -80,37 +205,43 @@ async def get_book(book_id: str):
 async def update_book(book_id: str, book_update: BookUpdate):
     """Update a book by its ID"""
     try:
-        if not ObjectId.is_valid(book_id):
-            raise HTTPException(status_code=400, detail="Invalid book ID format")
-        
-        # Check if book exists
-        existing_book = await db.books.find_one({"_id": ObjectId(book_id)})
-        if not existing_book:
-            raise HTTPException(status_code=404, detail="Book not found")
-        
-        # Check if ISBN is being updated and if it conflicts with another book
-        update_data = book_update.dict(exclude_unset=True)
-        if "ISBN" in update_data:
-            isbn_conflict = await db.books.find_one({
-                "ISBN": update_data["ISBN"],
-                "_id": {"$ne": ObjectId(book_id)}
-            })
-            if isbn_conflict:
-                raise HTTPException(status_code=400, detail="Another book with this ISBN already exists")
+        oid = parse_object_id(book_id, "Invalid book ID format")
         
+        update_data = book_update.model_dump(exclude_unset=True)
         if not update_data:
             raise HTTPException(status_code=400, detail="No fields to update")
         
-        result = await db.books.update_one(
-            {"_id": ObjectId(book_id)},
-            {"$set": update_data}
-        )
+        # Set in Python rather than with $currentDate so the merged response below
+        # carries the new value without re-reading the book
+        update_data["updated_at"] = utc_now()
+        if "genre" in update_data:
+            update_data["genre_lower"] = update_data["genre"].lower()
+        
+        # Update in one round-trip; an ISBN clash with another book is reported by
+        # the unique index. The previous version is returned so a genre change can
+        # be applied to the genre counters.
+        try:
+            previous_book = await db.books.find_one_and_update(
+                {"_id": oid},
+                {"$set": update_data},
+                projection=BOOK_PROJECTION,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Another book with this ISBN already exists")
+        
+        if not previous_book:
+            raise HTTPException(status_code=404, detail="Book not found")
         
-        if result.modified_count == 0:
-            raise HTTPException(status_code=400, detail="No changes made to the book")
+        if "genre" in update_data and update_data["genre"] != previous_book.get("genre"):
+            await asyncio.gather(
+                adjust_genre_count(previous_book.get("genre"), -1),
+                adjust_genre_count(update_data["genre"], 1)
+            )
         
-        # Retrieve updated book
-        updated_book = await db.books.find_one({"_id": ObjectId(book_id)})
+        await invalidate_cache()
+        
+        updated_book = {**previous_book, **update_data}
         updated_book["id"] = str(updated_book["_id"])
         del updated_book["_id"]
         
@@ -124,78 +255,118 @@ async def update_book(book_id: str, book_update: BookUpdate):
 async def delete_book(book_id: str):
     """Delete a book by its ID"""
     try:
-        if not ObjectId.is_valid(book_id):
-            raise HTTPException(status_code=400, detail="Invalid book ID format")
+        oid = parse_object_id(book_id, "Invalid book ID format")
         
-        result = await db.books.delete_one({"_id": ObjectId(book_id)})
-        if result.deleted_count == 0:
+        deleted_book = await db.books.find_one_and_delete(
+            {"_id": oid},
+            projection={"genre": 1}
+        )
+        if not deleted_book:
             raise HTTPException(status_code=404, detail="Book not found")
         
+        await adjust_genre_count(deleted_book.get("genre"), -1)
+        await invalidate_cache()
+        
         return {"message": "Book deleted successfully"}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Error deleting book: {str(e)}")
 
-@app.get("/books/", response_model=List[BookResponse])
+@app.get("/books/", response_model=BookListResponse)
 async def get_all_books(
-    skip: int = Query(0, ge=0, description="Number of books to skip"),
+    after_id: Optional[str] = Query(None, description="Return books after this ID (use next_cursor from the previous page)"),
     limit: int = Query(10, ge=1, le=100, description="Number of books to return")
 ):
-    """Get all books with pagination"""
+    """Get all books with cursor-based pagination"""
     try:
-        cursor = db.books.find().skip(skip).limit(limit)
-        books = await cursor.to_list(length=limit)
+        after_oid = parse_object_id(after_id, "Invalid cursor format") if after_id else None
+        
+        query_filter = {"_id": {"$gt": after_oid}} if after_oid else {}
         
-        for book in books:
-            book["id"] = str(book["_id"])
-            del book["_id"]
+        cursor = db.books.find(query_filter, projection=BOOK_PROJECTION).sort("_id", 1).limit(limit)
         
-        return [BookResponse(**book) for book in books]
+        # Convert documents as they stream in rather than buffering the page first
+        books = []
+        async for book in cursor:
+            book["id"] = str(book.pop("_id"))
+            books.append(BookResponse.model_construct(**book))
+        
+        next_cursor = books[-1].id if len(books) == limit else None
+        return BookListResponse.model_construct(books=books, next_cursor=next_cursor)
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=500, detail=f"Error retrieving books: {str(e)}")
 
 # Additional Operations
 
-@app.get("/books/search/", response_model=List[BookResponse])
+@app.get("/books/search/", response_model=BookListResponse)
 async def search_books(
     query: str = Query(..., min_length=1, description="Search query for title or author"),
-    skip: int = Query(0, ge=0, description="Number of books to skip"),
+    after_id: Optional[str] = Query(None, description="Return books after this ID (use next_cursor from the previous page)"),
     limit: int = Query(10, ge=1, le=100, description="Number of books to return")
 ):
     """Search books by title or author"""
     try:
-        search_filter = {
-            "$or": [
-                {"title": {"$regex": query, "$options": "i"}},
-                {"author": {"$regex": query, "$options": "i"}}
-            ]
-        }
+        after_oid = parse_object_id(after_id, "Invalid cursor format") if after_id else None
+        
+        key = cache_key("search", query=query, after_id=after_id, limit=limit)
+        cached, version = await get_cached(key)
+        if cached is not None:
+            return cached
+        
+        if len(query) < 3:
+            # Too short for useful text search; fall back to a case-insensitive
+            # substring match. No index serves this, so it scans the collection.
+            pattern = re.escape(query)
+            search_filter = {
+                "$or": [
+                    {"title": {"$regex": pattern, "$options": "i"}},
+                    {"author": {"$regex": pattern, "$options": "i"}}
+                ]
+            }
+        else:
+            # Use the (title, author) text index
+            search_filter = {"$text": {"$search": query}}
         
-        cursor = db.books.find(search_filter).skip(skip).limit(limit)
-        books = await cursor.to_list(length=limit)
+        if after_oid:
+            search_filter["_id"] = {"$gt": after_oid}
         
-        for book in books:
-            book["id"] = str(book["_id"])
-            del book["_id"]
+        cursor = db.books.find(search_filter, projection=BOOK_PROJECTION).sort("_id", 1).limit(limit)
         
-        return [BookResponse(**book) for book in books]
+        # Convert documents as they stream in rather than buffering the page first
+        books = []
+        async for book in cursor:
+            book["id"] = str(book.pop("_id"))
+            books.append(BookResponse.model_construct(**book))
+        
+        next_cursor = books[-1].id if len(books) == limit else None
+        page = BookListResponse.model_construct(books=books, next_cursor=next_cursor)
+        await set_cached(key, version, page.model_dump(mode="json"))
+        return page
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=500, detail=f"Error searching books: {str(e)}")
 
-@app.get("/books/filter/", response_model=List[BookResponse])
+@app.get("/books/filter/", response_model=BookListResponse)
 async def filter_books(
-    genre: Optional[str] = Query(None, description="Filter by genre"),
+    genre: Optional[str] = Query(None, description="Filter by genre (exact match, case-insensitive)"),
     publication_year: Optional[int] = Query(None, ge=1000, le=2024, description="Filter by publication year"),
-    skip: int = Query(0, ge=0, description="Number of books to skip"),
+    after_id: Optional[str] = Query(None, description="Return books after this ID (use next_cursor from the previous page)"),
     limit: int = Query(10, ge=1, le=100, description="Number of books to return")
 ):
     """Filter books by genre and/or publication year"""
     try:
+        after_oid = parse_object_id(after_id, "Invalid cursor format") if after_id else None
+        
         filter_dict = {}
         
         if genre:
-            filter_dict["genre"] = {"$regex": genre, "$options": "i"}
+            # Exact case-insensitive match on the stored lowercased genre, which
+            # the (genre_lower, publication_year) index serves directly
+            filter_dict["genre_lower"] = genre.lower()
         
         if publication_year:
             filter_dict["publication_year"] = publication_year
@@ -203,14 +374,26 @@ async def filter_books(
         if not filter_dict:
             raise HTTPException(status_code=400, detail="At least one filter parameter is required")
         
-        cursor = db.books.find(filter_dict).skip(skip).limit(limit)
-        books = await cursor.to_list(length=limit)
+        key = cache_key("filter", genre=genre, publication_year=publication_year, after_id=after_id, limit=limit)
+        cached, version = await get_cached(key)
+        if cached is not None:
+            return cached
         
-        for book in books:
-            book["id"] = str(book["_id"])
-            del book["_id"]
+        if after_oid:
+            filter_dict["_id"] = {"$gt": after_oid}
         
-        return [BookResponse(**book) for book in books]
+        cursor = db.books.find(filter_dict, projection=BOOK_PROJECTION).sort("_id", 1).limit(limit)
+        
+        # Convert documents as they stream in rather than buffering the page first
+        books = []
+        async for book in cursor:
+            book["id"] = str(book.pop("_id"))
+            books.append(BookResponse.model_construct(**book))
+        
+        next_cursor = books[-1].id if len(books) == limit else None
+        page = BookListResponse.model_construct(books=books, next_cursor=next_cursor)
+        await set_cached(key, version, page.model_dump(mode="json"))
+        return page
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -220,8 +403,16 @@ async def filter_books(
 async def count_total_books():
     """Count total number of books in the library"""
     try:
-        total_count = await db.books.count_documents({})
-        return {"total_books": total_count}
+        key = cache_key("count_total")
+        cached, version = await get_cached(key)
+        if cached is not None:
+            return cached
+        
+        # Read the count from collection metadata instead of scanning the collection
+        total_count = await db.books.estimated_document_count()
+        result = {"total_books": total_count}
+        await set_cached(key, version, result)
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error counting books: {str(e)}")
 
@@ -229,45 +420,58 @@ async def count_total_books():
 async def count_books_by_genre():
     """Count number of books per genre"""
     try:
-        pipeline = [
-            {
-                "$group": {
-                    "_id": "$genre",
-                    "count": {"$sum": 1}
-                }
-            },
-            {
-                "$sort": {"count": -1}
-            }
-        ]
+        key = cache_key("count_by_genre")
+        cached, version = await get_cached(key)
+        if cached is not None:
+            return cached
         
-        cursor = db.books.aggregate(pipeline)
-        genre_counts = await cursor.to_list(length=None)
+        # Read the counters maintained on create/update/delete instead of
+        # aggregating over every book
+        cursor = db.genre_counts.find({"count": {"$gt": 0}}).sort("count", -1)
         
         # Format the response
         result = {}
-        for item in genre_counts:
+        async for item in cursor:
             genre = item["_id"] if item["_id"] else "Unknown"
             result[genre] = item["count"]
         
-        return {"books_per_genre": result}
+        response = {"books_per_genre": result}
+        await set_cached(key, version, response)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error counting books by genre: {str(e)}")
 
 # Health check endpoint
+HEALTH_CHECK_INTERVAL = 5.0
+
+# Last probe result as (monotonic timestamp, error message or None if healthy)
+_last_health = (float("-inf"), None)
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test database connection
-        await db.books.find_one()
+    """Health check endpoint (probes the database at most every HEALTH_CHECK_INTERVAL seconds)"""
+    global _last_health
+    if time.monotonic() - _last_health[0] >= HEALTH_CHECK_INTERVAL:
+        try:
+            # Test database connection
+            await db.command('ping')
+            _last_health = (time.monotonic(), None)
+        except Exception as e:
+            _last_health = (time.monotonic(), str(e))
+    
+    error = _last_health[1]
+    if error is None:
         return {"status": "healthy", "database": "connected"}
-    except Exception as e:
-        return JSONResponse(
-            status_code=503,
-            content={"status": "unhealthy", "database": "disconnected", "error": str(e)}
-        )
+    return ORJSONResponse(
+        status_code=503,
+        content={"status": "unhealthy", "database": "disconnected", "error": error}
+    )
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    
+    # uvloop and httptools come with uvicorn[standard] (except on Windows)
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=loop, http=http)
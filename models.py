@@ -1,6 +1,10 @@
-from pydantic import BaseModel, Field, validator
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, List
 from datetime import datetime
+import re
+
+# ISBN-10 (last character may be X) or ISBN-13, with an optional hyphen or space after each digit
+_ISBN_RE = re.compile(r'(?:\d[- ]?){9}[\dXx]|(?:\d[- ]?){12}\d')
 
 class BookBase(BaseModel):
     """Base book model with common fields"""
@@ -10,27 +14,17 @@ class BookBase(BaseModel):
     genre: str = Field(..., min_length=1, max_length=50, description="Genre of the book")
     publication_year: int = Field(..., ge=1000, le=2024, description="Publication year of the book")
 
-    @validator('ISBN')
+    @field_validator('ISBN')
+    @classmethod
     def validate_isbn(cls, v):
         """Validate ISBN format (basic validation)"""
-        # Remove hyphens and spaces
-        isbn = v.replace('-', '').replace(' ', '')
-        
-        # Check if it's 10 or 13 digits
-        if not (len(isbn) == 10 or len(isbn) == 13):
-            raise ValueError('ISBN must be 10 or 13 characters long')
-        
-        # Check if all characters are digits (except last character of ISBN-10 can be X)
-        if len(isbn) == 10:
-            if not (isbn[:-1].isdigit() and (isbn[-1].isdigit() or isbn[-1].upper() == 'X')):
-                raise ValueError('Invalid ISBN-10 format')
-        else:  # ISBN-13
-            if not isbn.isdigit():
-                raise ValueError('Invalid ISBN-13 format')
+        if not _ISBN_RE.fullmatch(v):
+            raise ValueError('Invalid ISBN format, must be a valid ISBN-10 or ISBN-13')
         
         return v
 
-    @validator('title', 'author', 'genre')
+    @field_validator('title', 'author', 'genre')
+    @classmethod
     def validate_strings(cls, v):
         """Validate string fields are not just whitespace"""
         if not v.strip():
@@ -49,45 +43,44 @@ class BookUpdate(BaseModel):
     genre: Optional[str] = Field(None, min_length=1, max_length=50, description="Genre of the book")
     publication_year: Optional[int] = Field(None, ge=1000, le=2024, description="Publication year of the book")
 
-    @validator('ISBN')
+    @field_validator('ISBN')
+    @classmethod
     def validate_isbn(cls, v):
         """Validate ISBN format if provided"""
         if v is None:
             return v
         
-        # Remove hyphens and spaces
-        isbn = v.replace('-', '').replace(' ', '')
-        
-        # Check if it's 10 or 13 digits
-        if not (len(isbn) == 10 or len(isbn) == 13):
-            raise ValueError('ISBN must be 10 or 13 characters long')
-        
-        # Check if all characters are digits (except last character of ISBN-10 can be X)
-        if len(isbn) == 10:
-            if not (isbn[:-1].isdigit() and (isbn[-1].isdigit() or isbn[-1].upper() == 'X')):
-                raise ValueError('Invalid ISBN-10 format')
-        else:  # ISBN-13
-            if not isbn.isdigit():
-                raise ValueError('Invalid ISBN-13 format')
+        if not _ISBN_RE.fullmatch(v):
+            raise ValueError('Invalid ISBN format, must be a valid ISBN-10 or ISBN-13')
         
         return v
 
-    @validator('title', 'author', 'genre')
+    @field_validator('title', 'author', 'genre')
+    @classmethod
     def validate_strings(cls, v):
         """Validate string fields are not just whitespace if provided"""
         if v is not None and not v.strip():
             raise ValueError('Field cannot be empty or just whitespace')
         return v.strip() if v is not None else v
 
+    @field_validator('title', 'author', 'ISBN', 'genre', 'publication_year')
+    @classmethod
+    def reject_null(cls, v):
+        """Reject explicit nulls (omit a field to leave it unchanged)"""
+        if v is None:
+            raise ValueError('Field cannot be null; omit it to leave it unchanged')
+        return v
+
 class BookResponse(BookBase):
     """Model for book responses (includes ID)"""
     id: str = Field(..., description="Unique identifier of the book")
+    updated_at: Optional[datetime] = Field(None, description="When the book was created or last updated")
 
-    class Config:
+    model_config = ConfigDict(
         # Allow population by field name for MongoDB _id conversion
-        allow_population_by_field_name = True
+        populate_by_name=True,
         # Example for API documentation
-        schema_extra = {
+        json_schema_extra={
             "example": {
                 "id": "507f1f77bcf86cd799439011",
                 "title": "The Great Gatsby",
@@ -97,3 +90,21 @@ class BookResponse(BookBase):
                 "publication_year": 1925
             }
         }
+    )
+
+class BookListResponse(BaseModel):
+    """Model for paginated book list responses"""
+    books: List[BookResponse] = Field(..., description="Books on this page")
+    next_cursor: Optional[str] = Field(None, description="ID to pass as after_id to fetch the next page (null on the last page)")
+
+class BookBulkError(BaseModel):
+    """Model for a book that could not be inserted by a bulk create"""
+    index: int = Field(..., description="Position of the book in the request body")
+    detail: str = Field(..., description="Why the book was not inserted")
+
+class BookBulkCreateResponse(BaseModel):
+    """Model for bulk create responses"""
+    inserted_count: int = Field(..., description="Number of books inserted")
+    inserted_ids: List[str] = Field(..., description="IDs of the inserted books, in request order")
+    errors: List[BookBulkError] = Field(..., description="Books that were not inserted")
+    write_concern_errors: List[str] = Field(default_factory=list, description="Write concern errors; inserted books may not be durable when non-empty")